@@ -1,6 +1,6 @@
 """
 FastAPI app with Langfuse observability, Prometheus metrics, JSON logging,
-basic guardrails, and retry logic for LLM calls.
+basic guardrails, a semantic response cache, and retry logic for LLM calls.
 
 Endpoints:
 - GET /health   : liveness/readiness info
@@ -10,22 +10,38 @@ Endpoints:
 This module is framework- and vendor-agnostic; Langfuse is optional (graceful no-op).
 """
 
+import asyncio
 import logging
+import os
+import re
 import time
-import uuid
-from typing import List, Optional, cast
+from itertools import islice
+from typing import List, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException, Request
+import httpx
+import xxhash
+from cachetools import TTLCache  # type: ignore[import-untyped]
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import PlainTextResponse
-from openai import OpenAI
+from fastapi.responses import ORJSONResponse
+from openai import AsyncOpenAI
 from openai.types.chat import ChatCompletionMessageParam
+from prometheus_client import REGISTRY
+from prometheus_client.exposition import choose_encoder
 from pydantic import BaseModel, Field
-from tenacity import retry, stop_after_attempt, wait_exponential
 
+from src.cache import SemanticCache
 from src.config import settings
 from src.logging_setup import setup_logging
-from src.metrics import IN_PROGRESS, LLM_LATENCY, REQUEST_LATENCY, REQUESTS_TOTAL, TOKENS_USED
+from src.metrics import (
+    CACHE_HITS,
+    CACHE_MISSES,
+    IN_PROGRESS,
+    LLM_LATENCY,
+    REQUEST_LATENCY,
+    REQUESTS_TOTAL,
+    TOKENS_USED,
+)
 from src.obsv import Obs
 
 # --- JSON logging bootstrap ----------------------------------------------------
@@ -33,7 +49,12 @@ setup_logging(level=settings.log_level)
 logger = logging.getLogger("app")
 
 # --- FastAPI app ---------------------------------------------------------------
-app = FastAPI(title="Langfuse FastAPI Enhanced", version="2.0.0")
+# orjson-backed default responses: faster serialization of the (UTF-8) answers
+app = FastAPI(
+    title="Langfuse FastAPI Enhanced",
+    version="2.0.0",
+    default_response_class=ORJSONResponse,
+)
 
 # CORS: restrict in production to your frontends/domains
 app.add_middleware(
@@ -44,8 +65,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
 # --- LLM client (optional in tests; tests monkeypatch call_llm) ----------------
-client = OpenAI(api_key=settings.openai_api_key) if settings.openai_api_key else None
+# A single pooled HTTP/2 client is shared by every LLM call, so
+# TCP+TLS setup stays off the request path once connections are warm.
+def _build_llm_clients() -> Tuple[httpx.AsyncClient, Optional[AsyncOpenAI]]:
+    """Create the pooled HTTP client and the OpenAI client that uses it."""
+    http = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=200, max_keepalive_connections=100),
+        timeout=httpx.Timeout(30.0, connect=5.0),
+    )
+    llm = (
+        AsyncOpenAI(api_key=settings.openai_api_key, http_client=http)
+        if settings.openai_api_key
+        else None
+    )
+    return http, llm
+
+
+_http, client = _build_llm_clients()
 
 # --- Langfuse (graceful no-op if keys are missing) -----------------------------
 obs_enabled = all(
@@ -53,18 +92,46 @@ obs_enabled = all(
 )
 obs = Obs(enabled=obs_enabled)
 
+# --- Prompt: static system message built once (the OpenAI SDK does not mutate it)
+# Keeping it byte-identical across requests also preserves provider-side
+# prompt-prefix caching.
+_SYSTEM_MSG: ChatCompletionMessageParam = {
+    "role": "system",
+    "content": "Eres un asistente breve, preciso y en español.",
+}
+
+# --- Policy negative cache: questions whose answer was flagged, by xxh3 hash ---
+policy_block_cache: TTLCache = TTLCache(
+    maxsize=settings.negative_cache_size, ttl=settings.negative_cache_ttl
+)
+
+# --- Semantic cache (graceful no-op if disabled or deps are missing) -----------
+semantic_cache = SemanticCache(
+    enabled=settings.semantic_cache_enabled,
+    max_size=settings.cache_size,
+)
+
 
 @app.middleware("http")
 async def metrics_middleware(request: Request, call_next):
     """Attach a request_id, track in-progress requests, and record latency & counters.
 
     This middleware:
-      - Creates a UUID per request for log correlation (request.state.request_id).
+      - Creates a random 128-bit hex id per request for log correlation
+        (request.state.request_id).
       - Increments/decrements a Gauge of in-progress requests.
       - Observes per-endpoint latency & total request counters with status labels.
+
+    Endpoint labels use the matched route template (e.g. "/ask"), or "other" for
+    unmatched paths, so label cardinality is bounded by the declared routes.
+    The /metrics endpoint is never self-instrumented: scrapes would otherwise
+    show up in (and inflate) the very payload they fetch.
     """
+    if request.url.path == "/metrics":
+        return await call_next(request)
+
     IN_PROGRESS.inc()
-    request_id = str(uuid.uuid4())
+    request_id = os.urandom(16).hex()
     request.state.request_id = request_id
     start = time.perf_counter()
     status_code = 500
@@ -74,13 +141,14 @@ async def metrics_middleware(request: Request, call_next):
         return response
     finally:
         elapsed = time.perf_counter() - start
-        endpoint = request.url.path
+        endpoint = getattr(request.scope.get("route"), "path", "other")
         method = request.method
         REQUEST_LATENCY.labels(endpoint=endpoint, method=method).observe(elapsed)
         REQUESTS_TOTAL.labels(endpoint=endpoint, method=method, status=str(status_code)).inc()
         IN_PROGRESS.dec()
         logger.info(
-            f"request completed in {elapsed:.3f}s",
+            "request completed in %.3fs",
+            elapsed,
             extra={"request_id": request_id},
         )
 
@@ -115,11 +183,27 @@ class Answer(BaseModel):
     request_id: str
 
 
-@retry(
-    stop=stop_after_attempt(3),
-    wait=wait_exponential(multiplier=0.3, min=0.3, max=3),
-)
-def call_llm(
+@app.on_event("startup")
+async def open_http_client():
+    """Recreate the LLM clients if a previous lifespan closed them."""
+    global _http, client
+    if _http.is_closed:
+        _http, client = _build_llm_clients()
+
+
+@app.on_event("shutdown")
+async def close_http_client():
+    """Close the pooled HTTP client used by the LLM client."""
+    await _http.aclose()
+
+
+# Retry policy for provider calls: 3 attempts, exponential backoff 0.3s -> 3s.
+LLM_MAX_ATTEMPTS = 3
+LLM_RETRY_MIN_WAIT = 0.3
+LLM_RETRY_MAX_WAIT = 3.0
+
+
+async def call_llm(
     messages: List[ChatCompletionMessageParam],
     temperature: float = 0.2,
     model: str = "gpt-4o-mini",
@@ -136,24 +220,37 @@ def call_llm(
 
     Raises:
         RuntimeError: If the LLM client is not configured.
-        Exception: Any error from the provider (will be retried by tenacity).
+        Exception: The provider error from the last attempt, once retries are exhausted.
     """
     if client is None:
         raise RuntimeError("LLM not configured")
-    t0 = time.perf_counter()
-    # mypy: messages correctly typed as List[ChatCompletionMessageParam]
-    completion = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=temperature,
-    )
-    LLM_LATENCY.labels(model=model).observe(time.perf_counter() - t0)
-    return completion
+    delay = LLM_RETRY_MIN_WAIT
+    for attempt in range(1, LLM_MAX_ATTEMPTS + 1):
+        try:
+            t0 = time.perf_counter()
+            # mypy: messages correctly typed as List[ChatCompletionMessageParam]
+            completion = await client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+            )
+            LLM_LATENCY.labels(model=model).observe(time.perf_counter() - t0)
+            return completion
+        except Exception:
+            if attempt == LLM_MAX_ATTEMPTS:
+                raise
+            await asyncio.sleep(min(delay, LLM_RETRY_MAX_WAIT))
+            delay *= 2
+
+
+_WORD_RE = re.compile(r"\S+")
 
 
 def truncate_words(text: str, max_words: Optional[int]) -> str:
     """Soft-truncate text by word count, appending an ellipsis if truncated.
 
+    Whitespace between the kept words is preserved as-is.
+
     Args:
         text: Original text to truncate.
         max_words: Maximum number of words to keep; if None, no truncation.
@@ -163,10 +260,23 @@ def truncate_words(text: str, max_words: Optional[int]) -> str:
     """
     if max_words is None:
         return text
-    words = text.split()
-    if len(words) <= max_words:
+    # Scan only as far as word max_words + 1 instead of splitting the whole text
+    words = _WORD_RE.finditer(text)
+    kept = list(islice(words, max(max_words, 0)))
+    if next(words, None) is None:
         return text
-    return " ".join(words[:max_words]) + "…"
+    return (text[: kept[-1].end()] if kept else "") + "…"
+
+
+def question_hash(question: str) -> int:
+    """Hash a question (case-insensitively) for the policy negative cache."""
+    return xxhash.xxh3_64_intdigest(question.lower().encode("utf-8"))
+
+
+# Flagged terms for the toxicity heuristic, compiled once into a single
+# case-insensitive alternation (one C-level pass, no lowercase copy of the text).
+_BAD_WORDS = ("estúpido", "idiota", "odiar", "matar")
+_BAD_WORDS_RE = re.compile("|".join(map(re.escape, _BAD_WORDS)), re.IGNORECASE)
 
 
 def basic_toxicity_heuristic(text: str) -> float:
@@ -181,10 +291,10 @@ def basic_toxicity_heuristic(text: str) -> float:
     Returns:
         A float in [0.0, 1.0], where 1.0 indicates no flagged terms were found.
     """
-    bad = ["estúpido", "idiota", "odiar", "matar"]
-    lowered = text.lower()
-    hits = sum(1 for b in bad if b in lowered)
-    return 1.0 if hits == 0 else max(0.0, 1.0 - 0.2 * hits)
+    # Distinct flagged terms, matching the original "term in text" semantics
+    hits = len({m.group().lower() for m in _BAD_WORDS_RE.finditer(text)})
+    # Exact fifths (0.2 steps) so threshold comparisons are not skewed by float error
+    return max(0, 5 - hits) / 5
 
 
 @app.get("/health")
@@ -197,87 +307,136 @@ def health():
     }
 
 
-@app.get("/metrics", response_class=PlainTextResponse)
-def metrics():
-    """Prometheus exposition endpoint."""
-    from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+# Media ranges explicitly refused with q=0 (choose_encoder ignores q-values)
+_REFUSED_MEDIA_RE = re.compile(r";\s*q\s*=\s*0(?:\.0*)?\s*(?:;|$)")
+
+
+@app.get("/metrics")
+def metrics(request: Request):
+    """Prometheus exposition endpoint.
 
-    data = generate_latest()
-    return PlainTextResponse(content=data.decode("utf-8"), media_type=CONTENT_TYPE_LATEST)
+    Serves the OpenMetrics format when the scraper asks for it via the Accept
+    header (Prometheus does by default), otherwise the classic text format.
+    The exposition bytes are returned as-is (no decode/re-encode round-trip).
+    """
+    accept = ",".join(
+        media
+        for media in request.headers.get("accept", "").split(",")
+        if not _REFUSED_MEDIA_RE.search(media)
+    )
+    encoder, content_type = choose_encoder(accept)
+    return Response(content=encoder(REGISTRY), media_type=content_type)
 
 
 @app.post("/ask", response_model=Answer)
-def ask(req: Ask, request: Request):
+async def ask(req: Ask, request: Request):
     """Q&A endpoint backed by an LLM, with observability and guardrails.
 
     Flow:
-      1) Create a Langfuse trace (no-op if disabled).
-      2) Build a concise system prompt + user question.
-      3) Call the LLM with retry + latency metric.
-      4) Apply guardrails (truncate by word count).
-      5) Observe token usage and record Langfuse generation + scores.
+      1) Reject questions that recently produced a flagged answer (negative cache).
+      2) Create a Langfuse trace (no-op if disabled).
+      3) Look up the semantic cache; on a hit, skip the LLM call entirely.
+      4) On a miss, build the prompt and call the LLM with retry + latency metric.
+      5) Apply guardrails (truncate by word count).
+      6) Observe token usage and record Langfuse generation + scores; flagged
+         answers add the question to the negative cache, clean answers from the
+         LLM are stored in the semantic cache.
 
     Raises:
+      HTTPException(400): If the question is in the policy negative cache.
       HTTPException(502): If the upstream LLM call fails after retries.
     """
     request_id = request.state.request_id
 
-    # 1) Langfuse trace
+    # 1) Pre-LLM guardrail: known-bad questions never reach the LLM
+    q_hash = question_hash(req.question)
+    if q_hash in policy_block_cache:
+        CACHE_HITS.labels(kind="policy").inc()
+        raise HTTPException(status_code=400, detail="policy")
+
+    # 2) Langfuse trace
     trace = obs.trace(
         name="qa_chat",
         user_id=req.user_id,
         input=req.question,
         metadata={"prompt_version": "qa_enhanced_v1"},
     )
-
-    # 2) Prompt (typed to satisfy mypy & OpenAI types)
-    sys_prompt = "Eres un asistente breve, preciso y en español."
-    messages: List[ChatCompletionMessageParam] = [
-        cast(ChatCompletionMessageParam, {"role": "system", "content": sys_prompt}),
-        cast(ChatCompletionMessageParam, {"role": "user", "content": req.question}),
-    ]
-
-    # 3) LLM call with retry + latency metric
-    try:
-        completion = call_llm(messages, temperature=0.2)
-    except Exception as e:
-        logger.error(f"LLM error: {e}", extra={"request_id": request_id})
-        raise HTTPException(status_code=502, detail="Upstream LLM error")
-
-    # Raw answer
-    answer = completion.choices[0].message.content
-
-    # 4) Guardrail: truncate
-    answer = truncate_words(answer, req.max_words)
-
-    # 5) Tokens & Langfuse generation + scores
-    usage = getattr(completion, "usage", None)
-    if usage and hasattr(usage, "total_tokens"):
-        TOKENS_USED.observe(usage.total_tokens)  # type: ignore[attr-defined]
-
-    generation = obs.generation(
-        trace_id=getattr(trace, "id", None),
-        name="openai_chat_completion",
-        model="gpt-4o-mini",
-        input=req.question,
-        output=answer,
-        usage=usage.model_dump() if usage else None,  # type: ignore[union-attr]
-        metadata={"prompt_version": "qa_enhanced_v1"},
+    trace_id = getattr(trace, "id", None)
+
+    # 3) Semantic cache lookup (paraphrases of previously answered questions)
+    # Embedding is CPU-bound: keep it off the event loop
+    embedding = (
+        await asyncio.to_thread(semantic_cache.encode, req.question)
+        if semantic_cache.enabled
+        else None
     )
+    hit = semantic_cache.search(embedding, threshold=settings.cache_threshold)
+    if semantic_cache.enabled:
+        (CACHE_HITS if hit else CACHE_MISSES).labels(kind="semantic").inc()
+
+    usage = usage_dump = None
+    if hit is not None:
+        obs.score(trace_id=trace_id, name="cache_hit", value=1.0)
+        raw_answer = hit.answer
+    else:
+        # 4) Prompt: shared static system message + user question
+        messages: List[ChatCompletionMessageParam] = [
+            _SYSTEM_MSG,
+            {"role": "user", "content": req.question},
+        ]
+
+        # LLM call with retry + latency metric
+        try:
+            completion = await call_llm(messages, temperature=0.2)
+        except Exception as e:
+            logger.error("LLM error: %s", e, extra={"request_id": request_id})
+            raise HTTPException(status_code=502, detail="Upstream LLM error")
+
+        # Raw answer (cached untruncated so any max_words can be served later)
+        raw_answer = completion.choices[0].message.content
+        usage = getattr(completion, "usage", None)
+        usage_dump = usage.model_dump() if usage else None  # type: ignore[union-attr]
+
+    # 5) Guardrail: truncate
+    answer = truncate_words(raw_answer, req.max_words)
+
+    # 6) Tokens & Langfuse generation (only when the LLM was called) + scores
+    generation = None
+    if hit is None:
+        if usage and hasattr(usage, "total_tokens"):
+            TOKENS_USED.observe(usage.total_tokens)  # type: ignore[attr-defined]
+
+        generation = obs.generation(
+            trace_id=trace_id,
+            name="openai_chat_completion",
+            model="gpt-4o-mini",
+            input=req.question,
+            output=answer,
+            usage=usage_dump,
+            metadata={"prompt_version": "qa_enhanced_v1"},
+        )
     obs.score(
-        trace_id=getattr(trace, "id", None),
+        trace_id=trace_id,
         name="non_empty_answer",
         value=1.0 if answer.strip() else 0.0,
     )
-    obs.score(
-        trace_id=getattr(trace, "id", None),
-        name="toxicity_safe",
-        value=basic_toxicity_heuristic(answer),
-    )
-
-    return Answer(
+    safety = basic_toxicity_heuristic(answer)
+    obs.score(trace_id=trace_id, name="toxicity_safe", value=safety)
+    if safety < settings.toxicity_block_threshold:
+        policy_block_cache[q_hash] = True
+
+    # Only clean answers enter the semantic cache, or paraphrases of a blocked
+    # question would be served the flagged answer. The untruncated answer is
+    # checked since a later request may ask for more words.
+    if hit is None:
+        raw_safety = safety if answer is raw_answer else basic_toxicity_heuristic(raw_answer)
+        if raw_safety >= settings.toxicity_block_threshold:
+            semantic_cache.add(embedding, raw_answer, usage_dump)
+
+    # Server-authored data: skip field validation (Ask input is still fully validated)
+    return Answer.model_construct(
         answer=answer,
-        trace_id=getattr(trace, "id", "null"),
+        trace_id=trace_id if trace_id is not None else "null",
         generation_id=getattr(generation, "id", "null"),
         request_id=request_id,
     )
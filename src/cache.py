@@ -0,0 +1,126 @@
+"""
+Response caches for the FastAPI + Langfuse application.
+
+This module provides a semantic cache that sits in front of the LLM call so
+that paraphrases of previously answered questions are served from memory
+instead of paying a full upstream round-trip.
+
+The semantic cache relies on optional dependencies (`sentence-transformers`
+and `faiss-cpu`). If they are not installed or the cache is not enabled, all
+methods degrade gracefully to no-ops (every lookup is a miss), mirroring how
+Langfuse is handled in `src.obsv`.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, NamedTuple, Optional
+
+try:
+    import faiss
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+
+    _HAS = True
+except Exception:
+    # If the embedding/vector libraries are not available, the cache is disabled
+    _HAS = False
+
+
+class CacheEntry(NamedTuple):
+    """A cached LLM answer.
+
+    Attributes:
+        answer: Raw (untruncated) answer returned by the LLM.
+        usage: Token usage of the original completion (dict), if reported.
+    """
+
+    answer: str
+    usage: Optional[dict]
+
+
+class SemanticCache:
+    """Bounded in-memory semantic cache backed by a FAISS inner-product index.
+
+    Questions are embedded with a local sentence-transformers model using
+    L2-normalized float32 vectors, so inner product equals cosine similarity.
+    Entries are kept in LRU order; when `max_size` is reached the least
+    recently used entry is evicted from both the dict and the FAISS index.
+
+    Attributes:
+        enabled: True if the cache is active (requested and dependencies installed).
+        max_size: Maximum number of cached entries (0 disables inserts).
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        max_size: int = 10_000,
+        model_name: str = "all-MiniLM-L6-v2",
+    ):
+        """Initialize the cache.
+
+        Args:
+            enabled: If True and the optional dependencies are installed, load
+                the embedding model and build the index.
+            max_size: Maximum number of entries before LRU eviction.
+            model_name: sentence-transformers model used to embed questions.
+        """
+        self.enabled = enabled and _HAS
+        self.max_size = max_size
+        self._entries: "OrderedDict[int, CacheEntry]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._model: Any = None
+        self._index: Any = None
+        if self.enabled:
+            self._model = SentenceTransformer(model_name)
+            dim = self._model.get_sentence_embedding_dimension()
+            self._index = faiss.IndexIDMap(faiss.IndexFlatIP(dim))
+
+    def encode(self, text: str) -> Any:
+        """Embed a text into a (1, dim) L2-normalized float32 array (None if disabled)."""
+        if not self.enabled:
+            return None
+        emb = self._model.encode([text], normalize_embeddings=True)
+        return np.asarray(emb, dtype=np.float32)
+
+    def search(self, emb: Any, threshold: float) -> Optional[CacheEntry]:
+        """Return the closest cached entry if its cosine similarity is >= threshold.
+
+        Args:
+            emb: Embedding returned by `encode`.
+            threshold: Minimum cosine similarity to count as a hit.
+
+        Returns:
+            The cached entry on a hit, otherwise None.
+        """
+        if not self.enabled or emb is None:
+            return None
+        with self._lock:
+            if not self._entries:
+                return None
+            scores, ids = self._index.search(emb, 1)
+            entry_id = int(ids[0][0])
+            if entry_id == -1 or float(scores[0][0]) < threshold:
+                return None
+            self._entries.move_to_end(entry_id)
+            return self._entries[entry_id]
+
+    def add(self, emb: Any, answer: str, usage: Optional[dict] = None) -> None:
+        """Insert an (embedding, answer, usage) tuple, evicting the LRU entry if full.
+
+        Args:
+            emb: Embedding returned by `encode`.
+            answer: Raw answer returned by the LLM.
+            usage: Token usage of the completion (dict), if any.
+        """
+        if not self.enabled or emb is None or self.max_size <= 0:
+            return
+        with self._lock:
+            if len(self._entries) >= self.max_size:
+                oldest, _ = self._entries.popitem(last=False)
+                self._index.remove_ids(np.array([oldest], dtype=np.int64))
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(emb, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = CacheEntry(answer=answer, usage=usage)
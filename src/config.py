@@ -13,6 +13,12 @@ Environment variables:
     LANGFUSE_PUBLIC_KEY  : Optional Langfuse public key
     LANGFUSE_SECRET_KEY  : Optional Langfuse secret key
     LANGFUSE_HOST        : Optional Langfuse host URL
+    SEMANTIC_CACHE_ENABLED : Enable the semantic response cache (default: "false")
+    CACHE_THRESHOLD      : Cosine similarity required for a semantic cache hit (default: 0.92)
+    CACHE_SIZE           : Maximum entries kept in the semantic cache (default: 10000)
+    TOXICITY_BLOCK_THRESHOLD : Safety score below which a question is blocked (default: 0.4)
+    NEGATIVE_CACHE_SIZE  : Maximum blocked questions remembered (default: 4096)
+    NEGATIVE_CACHE_TTL   : Seconds a question stays blocked (default: 3600)
 """
 
 import os
@@ -31,6 +37,12 @@ class Settings(BaseModel):
         langfuse_public_key: Langfuse public key (optional).
         langfuse_secret_key: Langfuse secret key (optional).
         langfuse_host: Langfuse host URL (optional).
+        semantic_cache_enabled: Whether to serve paraphrased questions from the semantic cache.
+        cache_threshold: Minimum cosine similarity for a semantic cache hit.
+        cache_size: Maximum number of entries in the semantic cache (LRU eviction).
+        toxicity_block_threshold: Answers scoring below this block their question.
+        negative_cache_size: Maximum number of blocked questions kept (LRU eviction).
+        negative_cache_ttl: Seconds a blocked question is rejected without calling the LLM.
     """
 
     app_env: str = os.getenv("APP_ENV", "dev")
@@ -40,6 +52,12 @@ class Settings(BaseModel):
     langfuse_public_key: str | None = os.getenv("LANGFUSE_PUBLIC_KEY")
     langfuse_secret_key: str | None = os.getenv("LANGFUSE_SECRET_KEY")
     langfuse_host: str | None = os.getenv("LANGFUSE_HOST")
+    semantic_cache_enabled: bool = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+    cache_threshold: float = float(os.getenv("CACHE_THRESHOLD", "0.92"))
+    cache_size: int = int(os.getenv("CACHE_SIZE", "10000"))
+    toxicity_block_threshold: float = float(os.getenv("TOXICITY_BLOCK_THRESHOLD", "0.4"))
+    negative_cache_size: int = int(os.getenv("NEGATIVE_CACHE_SIZE", "4096"))
+    negative_cache_ttl: float = float(os.getenv("NEGATIVE_CACHE_TTL", "3600"))
 
 
 # Global settings instance used throughout the app
@@ -6,14 +6,16 @@ parse in observability backends like ELK, Datadog, or Google Cloud Logging.
 
 Features:
 - Logs are written to stdout (12-factor compliant).
-- Messages are formatted as JSON objects with level, logger name, and message.
+- Messages are formatted as JSON objects with level, logger name, and message
+  (encoded with orjson, since the formatter runs on every request).
 - Optionally includes a `request_id` field if provided via `extra` in logging calls.
 """
 
-import json
 import logging
 import sys
 
+import orjson
+
 
 class JsonFormatter(logging.Formatter):
     """Custom logging formatter that outputs logs as JSON objects.
@@ -42,19 +44,31 @@ class JsonFormatter(logging.Formatter):
         # Attach request_id if present in extra context
         if hasattr(record, "request_id"):
             base["request_id"] = record.request_id
-        return json.dumps(base)
+        return orjson.dumps(base, default=str).decode("utf-8")
+
+
+_configured = False
 
 
-def setup_logging(level: str = "INFO") -> None:
+def setup_logging(level: str = "INFO", force: bool = False) -> None:
     """Configure root logger to output JSON-formatted logs to stdout.
 
-    This replaces any existing handlers with a single StreamHandler.
+    This replaces any existing handlers with a single StreamHandler. It is
+    idempotent: repeated calls (e.g., re-imports in test sessions) are no-ops
+    unless `force` is True.
 
     Args:
         level: Logging level as a string ("DEBUG", "INFO", "WARNING", "ERROR").
+            Unknown names fall back to INFO.
+        force: Reconfigure even if logging was already set up.
     """
+    global _configured
+    if _configured and not force:
+        return
+    levelno = logging.getLevelNamesMapping().get(level.upper(), logging.INFO)
     handler = logging.StreamHandler(sys.stdout)
     handler.setFormatter(JsonFormatter())
     root = logging.getLogger()
     root.handlers = [handler]
-    root.setLevel(level)
+    root.setLevel(levelno)
+    _configured = True
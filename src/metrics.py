@@ -11,40 +11,99 @@ Metrics included:
     - LLM_LATENCY: Histogram of latencies for calls to the LLM backend.
     - IN_PROGRESS: Gauge of requests currently in progress.
     - TOKENS_USED: Histogram of token usage per LLM request.
+    - CACHE_HITS: Counter of response cache hits, labeled by cache kind.
+    - CACHE_MISSES: Counter of response cache misses, labeled by cache kind.
+
+The `*_created` timestamp series are disabled: they add one extra series per
+counter/histogram child and nothing in our dashboards reads them. (Native/sparse
+histograms are not supported by prometheus-client 0.20, so histograms keep
+explicit, compact bucket layouts instead.)
 """
 
-from prometheus_client import Counter, Gauge, Histogram
+from typing import Any, Type, TypeVar
+
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram, disable_created_metrics
+
+# Same effect as PROMETHEUS_DISABLE_CREATED_SERIES=1, without relying on the env.
+disable_created_metrics()
+
+_M = TypeVar("_M", Counter, Gauge, Histogram)
+
+
+def _get_or_create(cls: Type[_M], name: str, *args: Any, **kwargs: Any) -> _M:
+    """Create a collector, or reuse the one already registered under `name`.
+
+    Makes this module safe to import twice (e.g., reloads in test sessions)
+    instead of failing with a duplicate-registration ValueError.
+    """
+    existing = REGISTRY._names_to_collectors.get(name)
+    if existing is not None:
+        return existing  # type: ignore[return-value]
+    try:
+        return cls(name, *args, **kwargs)
+    except ValueError:
+        # Only a duplicate registration is recoverable; invalid arguments propagate
+        existing = REGISTRY._names_to_collectors.get(name)
+        if existing is None:
+            raise
+        return existing  # type: ignore[return-value]
+
 
 #: Counter of total HTTP requests labeled by endpoint, method, and status code.
-REQUESTS_TOTAL = Counter(
+REQUESTS_TOTAL = _get_or_create(
+    Counter,
     "app_requests_total",
     "Total HTTP requests",
     ["endpoint", "method", "status"],
 )
 
 #: Histogram of HTTP request latency in seconds, labeled by endpoint and method.
-REQUEST_LATENCY = Histogram(
+#: Buckets span 50ms-32s: an LLM-backed endpoint lives in the seconds range.
+REQUEST_LATENCY = _get_or_create(
+    Histogram,
     "app_request_latency_seconds",
     "Latency of HTTP requests in seconds",
     ["endpoint", "method"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32),
 )
 
 #: Histogram of latencies (in seconds) for LLM calls, labeled by model name.
-LLM_LATENCY = Histogram(
+#: Exponential buckets from 100ms to 32s to resolve the LLM latency band.
+LLM_LATENCY = _get_or_create(
+    Histogram,
     "app_llm_latency_seconds",
     "Latency of LLM calls in seconds",
     ["model"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32),
 )
 
 #: Gauge of in-progress HTTP requests (incremented/decremented in middleware).
-IN_PROGRESS = Gauge(
+IN_PROGRESS = _get_or_create(
+    Gauge,
     "app_requests_in_progress",
     "In-progress HTTP requests",
 )
 
 #: Histogram of token usage per request to the LLM, useful to monitor costs.
-TOKENS_USED = Histogram(
+TOKENS_USED = _get_or_create(
+    Histogram,
     "app_llm_tokens_used",
     "Tokens used per request",
-    buckets=(0, 50, 100, 200, 400, 800, 1600, 3200, 6400),
+    buckets=(0, 50, 100, 200, 400, 800, 1600, 3200, 6400, 12800),
+)
+
+#: Counter of response cache hits (answers served without calling the LLM).
+CACHE_HITS = _get_or_create(
+    Counter,
+    "app_cache_hits_total",
+    "Response cache hits",
+    ["kind"],
+)
+
+#: Counter of response cache misses (lookups that fell through to the LLM).
+CACHE_MISSES = _get_or_create(
+    Counter,
+    "app_cache_misses_total",
+    "Response cache misses",
+    ["kind"],
 )
@@ -38,6 +38,19 @@ class _Null:
         ...
 
 
+_NULL = _Null()
+
+
+def _null(**k):
+    """Return the shared no-op object (used as trace/span/generation when disabled)."""
+    return _NULL
+
+
+def _noop(**k):
+    """Do nothing (used as score when disabled)."""
+    return None
+
+
 class Obs:
     """Observability wrapper class for Langfuse.
 
@@ -58,20 +71,23 @@ class Obs:
             enabled: If True and Langfuse is installed, create a client.
         """
         self.client = Langfuse() if (enabled and _HAS) else None
+        if self.client is None:
+            # Disabled: bind bare no-ops so calls skip the per-call client check
+            self.trace = self.span = self.generation = _null  # type: ignore[method-assign]
+            self.score = _noop  # type: ignore[method-assign]
 
     def trace(self, **k):
         """Create a Langfuse trace (or no-op if disabled)."""
-        return self.client.trace(**k) if self.client else _Null()
+        return self.client.trace(**k)
 
     def span(self, **k):
         """Create a Langfuse span (or no-op if disabled)."""
-        return self.client.span(**k) if self.client else _Null()
+        return self.client.span(**k)
 
     def generation(self, **k):
         """Create a Langfuse generation (or no-op if disabled)."""
-        return self.client.generation(**k) if self.client else _Null()
+        return self.client.generation(**k)
 
     def score(self, **k):
         """Record a Langfuse score (no-op if disabled)."""
-        if self.client:
-            self.client.score(**k)
+        self.client.score(**k)
@@ -3,11 +3,22 @@ Tests for the FastAPI application.
 
 This suite verifies:
 - /health responds and provides basic flags
-- /metrics exposes Prometheus metrics
+- /metrics exposes Prometheus metrics (classic text or OpenMetrics)
 - /ask works when the LLM call is stubbed (no external dependency)
-- Guardrail truncation is applied when max_words is set
+- Guardrail truncation is applied when max_words is set (and preserves whitespace)
+- A semantic cache hit short-circuits the LLM call
+- Questions that produced a flagged answer are rejected before the LLM on retry
+  (and the flagged answer is kept out of the semantic cache)
+- Provider calls are retried up to 3 attempts before the error surfaces
+- The toxicity heuristic counts distinct flagged terms case-insensitively
+- Request metrics are labeled by route template, with unmatched paths as "other"
+- Re-importing the metrics module reuses the registered collectors
+- The pooled HTTP client survives repeated app lifespans
 """
 
+import asyncio
+
+import pytest
 from fastapi.testclient import TestClient
 
 from src.app import app
@@ -32,6 +43,19 @@ def test_metrics_endpoint_exists():
     # Basic presence checks for exported metrics names
     assert "app_requests_total" in r.text
     assert "app_request_latency_seconds" in r.text
+    assert "_created" not in r.text
+
+
+def test_metrics_endpoint_openmetrics():
+    """Scrapers asking for OpenMetrics get that format."""
+    r = client.get("/metrics", headers={"Accept": "application/openmetrics-text"})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/openmetrics-text")
+    assert r.text.rstrip().endswith("# EOF")
+
+    # A media range refused with q=0 falls back to the classic text format
+    r = client.get("/metrics", headers={"Accept": "application/openmetrics-text;q=0, text/plain"})
+    assert r.headers["content-type"].startswith("text/plain")
 
 
 def test_ask_with_stubbed_llm(monkeypatch):
@@ -70,7 +94,7 @@ def test_ask_with_stubbed_llm(monkeypatch):
             self.choices = [Choice(content)]
             self.usage = UsageObj()
 
-    def fake_call_llm(messages, temperature=0.2, model="gpt-4o-mini"):
+    async def fake_call_llm(messages, temperature=0.2, model="gpt-4o-mini"):
         """Fake LLM call used by tests."""
         return Completion("Respuesta de prueba suficientemente larga para pasar la métrica.")
 
@@ -123,7 +147,10 @@ def test_guardrail_truncate(monkeypatch):
     long_text = " ".join(["palabra"] * 100)
 
     # Patch the app's LLM call to return predictable output
-    monkeypatch.setattr(appmod, "call_llm", lambda *a, **k: Completion(long_text))
+    async def fake_call_llm(*a, **k):
+        return Completion(long_text)
+
+    monkeypatch.setattr(appmod, "call_llm", fake_call_llm)
 
     # Usar una pregunta con longitud >= 3 para pasar la validación del Pydantic model
     r = client.post("/ask", json={"user_id": "u", "question": "que tal", "max_words": 10})
@@ -133,3 +160,187 @@ def test_guardrail_truncate(monkeypatch):
     # Debe truncar a 10 palabras y terminar con elipsis "…"
     assert answer.endswith("…")
     assert len(answer.split()) <= 10
+
+
+def test_semantic_cache_hit_skips_llm(monkeypatch):
+    """A semantic cache hit returns the cached answer without calling the LLM."""
+    from src import app as appmod
+    from src.cache import CacheEntry
+
+    class FakeCache:
+        """Semantic cache stub that always hits."""
+
+        enabled = True
+
+        def encode(self, text):
+            return [[1.0]]
+
+        def search(self, emb, threshold):
+            return CacheEntry(answer="respuesta cacheada", usage={"total_tokens": 5})
+
+        def add(self, emb, answer, usage=None):
+            raise AssertionError("cache hits must not be re-inserted")
+
+    async def fail_call_llm(*a, **k):
+        raise AssertionError("LLM must not be called on a cache hit")
+
+    monkeypatch.setattr(appmod, "semantic_cache", FakeCache())
+    monkeypatch.setattr(appmod, "call_llm", fail_call_llm)
+
+    r = client.post("/ask", json={"user_id": "u", "question": "¿Qué es Langfuse?"})
+    assert r.status_code == 200, r.text
+    assert r.json()["answer"] == "respuesta cacheada"
+
+
+def test_toxicity_heuristic():
+    """Each distinct flagged term lowers the score by 0.2, regardless of case."""
+    from src.app import basic_toxicity_heuristic
+
+    assert basic_toxicity_heuristic("Todo bien por aquí") == 1.0
+    assert basic_toxicity_heuristic("IDIOTA, idiota") == 0.8
+    assert basic_toxicity_heuristic("Estúpido idiota, vas a matar") == 0.4
+    assert basic_toxicity_heuristic("Estúpido idiota, vas a matar y odiar") == 0.2
+
+
+def test_metrics_labels_use_route_templates():
+    """Unknown paths collapse into a single "other" label; /metrics is not instrumented."""
+    client.get("/health")
+    client.get("/scanner/probe-12345")
+    text = client.get("/metrics").text
+    assert 'endpoint="/health"' in text
+    assert 'endpoint="other"' in text
+    assert "probe-12345" not in text
+    assert 'endpoint="/metrics"' not in text
+
+
+def test_truncate_words_preserves_spacing():
+    """truncate_words keeps the original spacing and leaves short texts untouched."""
+    from src.app import truncate_words
+
+    assert truncate_words("uno  dos\ntres cuatro", 3) == "uno  dos\ntres…"
+    assert truncate_words("uno dos", 2) == "uno dos"
+    assert truncate_words("uno dos", None) == "uno dos"
+    assert truncate_words("uno dos", 0) == "…"
+
+
+def test_call_llm_retries(monkeypatch):
+    """Transient provider errors are retried; the last error is raised after 3 attempts."""
+    from types import SimpleNamespace
+
+    from src import app as appmod
+
+    attempts = []
+
+    async def flaky_create(**kwargs):
+        attempts.append(kwargs["model"])
+        if len(attempts) < 3:
+            raise ConnectionError("transient")
+        return "ok"
+
+    fake_client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=flaky_create))
+    )
+    monkeypatch.setattr(appmod, "client", fake_client)
+    monkeypatch.setattr(appmod, "LLM_RETRY_MIN_WAIT", 0.0)  # no backoff delay in tests
+
+    assert asyncio.run(appmod.call_llm([], 0.2, "m")) == "ok"
+    assert len(attempts) == 3
+
+    async def always_fail(**kwargs):
+        attempts.append(kwargs["model"])
+        raise ConnectionError("down")
+
+    attempts.clear()
+    fake_client.chat.completions.create = always_fail
+    with pytest.raises(ConnectionError):
+        asyncio.run(appmod.call_llm([], 0.2, "m"))
+    assert len(attempts) == 3
+
+
+def test_flagged_question_is_blocked_before_llm(monkeypatch):
+    """Once a question yields an answer scoring below 0.4, repeats get 400 without the LLM.
+
+    Three flagged terms score exactly 0.4 and are not blocked; four (0.2) are.
+    """
+    from cachetools import TTLCache
+
+    from src import app as appmod
+
+    calls = []
+    answers = {
+        "borderline": "Eres un idiota, estúpido, te voy a matar",
+        "flagged": "Eres un idiota, estúpido, te voy a matar y a odiar",
+    }
+
+    class Completion:
+        """Completion carrying a canned answer."""
+
+        def __init__(self, content):
+            msg = type("Msg", (), {"content": content})
+            self.choices = [type("Choice", (), {"message": msg})]
+            self.usage = None
+
+    async def toxic_call_llm(messages, *a, **k):
+        calls.append(1)
+        return Completion(answers[messages[-1]["content"].split()[0].lower()])
+
+    class RecordingCache:
+        """Semantic cache stub that never hits and records inserts."""
+
+        enabled = True
+        added = []
+
+        def encode(self, text):
+            return [[1.0]]
+
+        def search(self, emb, threshold):
+            return None
+
+        def add(self, emb, answer, usage=None):
+            self.added.append(answer)
+
+    monkeypatch.setattr(appmod, "call_llm", toxic_call_llm)
+    monkeypatch.setattr(appmod, "policy_block_cache", TTLCache(maxsize=8, ttl=60))
+    monkeypatch.setattr(appmod, "semantic_cache", RecordingCache())
+
+    # Exactly 0.4 is not "below 0.4": the question is not blocked
+    borderline = {"user_id": "u", "question": "borderline insúltame"}
+    assert client.post("/ask", json=borderline).status_code == 200
+    assert client.post("/ask", json=borderline).status_code == 200
+    assert len(calls) == 2
+
+    flagged = {"user_id": "u", "question": "flagged insúltame"}
+    assert client.post("/ask", json=flagged).status_code == 200
+    r = client.post("/ask", json={**flagged, "question": "FLAGGED INSÚLTAME"})
+    assert r.status_code == 400
+    assert len(calls) == 3
+    # The flagged answer must not be replayed to paraphrases via the semantic cache
+    assert answers["flagged"] not in RecordingCache.added
+    assert answers["borderline"] in RecordingCache.added
+
+
+def test_metrics_module_reload_is_idempotent():
+    """Reloading src.metrics must not raise on duplicate registration."""
+    import importlib
+
+    from src import metrics
+
+    before = metrics.REQUESTS_TOTAL
+    importlib.reload(metrics)
+    assert metrics.REQUESTS_TOTAL is before
+
+    # Invalid arguments still surface their own error
+    with pytest.raises(ValueError, match="sorted"):
+        metrics._get_or_create(metrics.Histogram, "app_bad_hist", "x", buckets=(2, 1))
+
+
+def test_http_client_reopened_after_lifespan():
+    """A second lifespan gets a usable HTTP client after the first one closed it."""
+    from src import app as appmod
+
+    with TestClient(app):
+        pass
+    assert appmod._http.is_closed
+
+    with TestClient(app):
+        assert not appmod._http.is_closed
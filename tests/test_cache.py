@@ -0,0 +1,114 @@
+"""
+Tests for the response caches.
+
+The semantic cache's optional dependencies (faiss, sentence-transformers,
+numpy) are not installed in CI, so they are replaced with tiny pure-Python
+fakes injected into `src.cache`. This exercises the real SemanticCache logic:
+index setup, threshold check, LRU refresh on hit, and eviction.
+
+This suite verifies:
+- Hits/misses around the similarity threshold
+- LRU eviction keeps the entry dict and the index in sync
+- max_size=0 never stores (and never raises)
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from src import cache as cachemod
+
+
+class FakeIndex:
+    """Inner-product index keyed by explicit ids (mimics faiss.IndexIDMap)."""
+
+    def __init__(self, inner):
+        self.vectors = {}
+
+    def add_with_ids(self, emb, ids):
+        for vec, i in zip(emb, ids):
+            self.vectors[i] = vec
+
+    def remove_ids(self, ids):
+        for i in ids:
+            self.vectors.pop(i, None)
+
+    def search(self, emb, k):
+        query = emb[0]
+        best_id, best = -1, float("-inf")
+        for i, vec in self.vectors.items():
+            score = sum(a * b for a, b in zip(query, vec))
+            if score > best:
+                best_id, best = i, score
+        return [[best]], [[best_id]]
+
+
+class FakeModel:
+    """Embeds known texts into fixed unit vectors."""
+
+    VECTORS = {
+        "a": [1.0, 0.0, 0.0],
+        "a'": [0.95, 0.3122, 0.0],  # cosine 0.95 with "a"
+        "b": [0.0, 1.0, 0.0],
+        "c": [0.0, 0.0, 1.0],
+    }
+
+    def __init__(self, name):
+        self.name = name
+
+    def get_sentence_embedding_dimension(self):
+        return 3
+
+    def encode(self, texts, normalize_embeddings=True):
+        return [self.VECTORS[t] for t in texts]
+
+
+@pytest.fixture
+def fake_backend(monkeypatch):
+    """Inject fake faiss / numpy / SentenceTransformer into src.cache."""
+    fake_faiss = SimpleNamespace(IndexFlatIP=lambda dim: dim, IndexIDMap=FakeIndex)
+    fake_np = SimpleNamespace(
+        asarray=lambda x, dtype=None: x,
+        array=lambda x, dtype=None: list(x),
+        float32=float,
+        int64=int,
+    )
+    monkeypatch.setattr(cachemod, "_HAS", True)
+    monkeypatch.setattr(cachemod, "faiss", fake_faiss, raising=False)
+    monkeypatch.setattr(cachemod, "np", fake_np, raising=False)
+    monkeypatch.setattr(cachemod, "SentenceTransformer", FakeModel, raising=False)
+
+
+def test_semantic_cache_threshold(fake_backend):
+    """Close paraphrases hit, dissimilar questions miss."""
+    sc = cachemod.SemanticCache(enabled=True, max_size=4)
+    assert sc.search(sc.encode("a"), threshold=0.92) is None
+    sc.add(sc.encode("a"), "respuesta a", {"total_tokens": 3})
+
+    hit = sc.search(sc.encode("a'"), threshold=0.92)
+    assert hit == cachemod.CacheEntry(answer="respuesta a", usage={"total_tokens": 3})
+    assert sc.search(sc.encode("a'"), threshold=0.96) is None
+    assert sc.search(sc.encode("b"), threshold=0.92) is None
+
+
+def test_semantic_cache_lru_eviction(fake_backend):
+    """The least recently used entry is evicted from both the dict and the index."""
+    sc = cachemod.SemanticCache(enabled=True, max_size=2)
+    sc.add(sc.encode("a"), "A")
+    sc.add(sc.encode("b"), "B")
+    assert sc.search(sc.encode("a"), threshold=0.99).answer == "A"  # refresh "a"
+
+    sc.add(sc.encode("c"), "C")  # evicts "b"
+    assert len(sc._entries) == len(sc._index.vectors) == 2
+    assert set(sc._entries) == set(sc._index.vectors)
+    assert sc.search(sc.encode("b"), threshold=0.99) is None
+    assert sc.search(sc.encode("a"), threshold=0.99).answer == "A"
+    assert sc.search(sc.encode("c"), threshold=0.99).answer == "C"
+
+
+def test_semantic_cache_zero_size(fake_backend):
+    """max_size=0 stores nothing instead of failing on eviction."""
+    sc = cachemod.SemanticCache(enabled=True, max_size=0)
+    sc.add(sc.encode("a"), "A")
+    assert sc.search(sc.encode("a"), threshold=0.5) is None
+    assert not sc._entries and not sc._index.vectors